@@ -4,36 +4,41 @@ Script to add IDs to flashcards and create separate progress tracking file.
 This separates the static flashcard data from the dynamic spaced repetition progress.
 """
 
-import json
 import os
+import shutil
 from datetime import datetime
-from typing import List, Dict, Any
-
-def load_flashcards(filepath: str) -> List[Dict[str, Any]]:
-    """Load flashcards from JSON file."""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def save_json(data: Any, filepath: str) -> None:
-    """Save data to JSON file with proper formatting."""
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def create_progress_entry(card_id: int) -> Dict[str, Any]:
-    """Create initial progress entry for a flashcard."""
-    return {
-        "id": card_id,
-        "date_last_studied": None,
-        "num_times_studied": 0,
-        "ease_factor": 2.5,  # Initial ease factor
-        "interval": 1,       # Initial interval (days)
-        "repetitions": 0,    # Number of successful reviews in a row
-        "total_correct": 0,
-        "total_incorrect": 0,
-        "total_studied": 0,
-        "total_correct_streak": 0,
-        "total_incorrect_streak": 0
-    }
+from typing import IO, Iterator, Dict, Any
+
+from progress_entries import create_progress_entry
+
+try:
+    import ijson.backends.yajl2_c as ijson
+except ImportError:  # C backend not built; use the default (slower) ijson backend
+    import ijson
+
+try:
+    import orjson
+except ImportError:  # Fall back to stdlib json when the orjson wheel is unavailable
+    orjson = None
+    import json
+
+def load_flashcards(filepath: str) -> Iterator[Dict[str, Any]]:
+    """Stream flashcards one at a time from a top-level JSON array."""
+    with open(filepath, 'rb') as f:
+        yield from ijson.items(f, 'item', use_float=True)
+
+def dump_json_item(data: Any) -> bytes:
+    """Serialize a single array element, indented to sit inside a top-level array."""
+    if orjson is None:
+        encoded = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    else:
+        encoded = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return b"  " + encoded.replace(b"\n", b"\n  ")
+
+def write_json_array_item(f: IO[bytes], data: Any, first: bool) -> None:
+    """Append one element to a JSON array being written incrementally."""
+    f.write(b"\n" if first else b",\n")
+    f.write(dump_json_item(data))
 
 def main():
     # File paths
@@ -41,40 +46,49 @@ def main():
     flashcards_with_ids_path = "flashcard_generation/flashcards_with_ids.json"
     progress_path = "flashcard_generation/flashcard_progress.json"
 
-    # Load existing flashcards
-    print("Loading flashcards...")
-    flashcards = load_flashcards(flashcards_path)
+    # Stream flashcards in and write both outputs incrementally, so neither the
+    # input deck nor the derived lists are ever held in memory as a whole.
+    # Write to temp files first so a bad or missing input never clobbers existing outputs
+    print("Processing flashcards...")
+    cards_tmp_path = f"{flashcards_with_ids_path}.tmp"
+    progress_tmp_path = f"{progress_path}.tmp"
+    count = 0
+    try:
+        with open(cards_tmp_path, 'wb') as cards_out, open(progress_tmp_path, 'wb') as progress_out:
+            cards_out.write(b"[")
+            progress_out.write(b"[")
 
-    # Add IDs to flashcards and create progress entries
-    flashcards_with_ids = []
-    progress_data = []
+            for i, card in enumerate(load_flashcards(flashcards_path), 1):
+                # Add ID to flashcard
+                write_json_array_item(cards_out, {"id": i, **card}, first=(i == 1))
 
-    print(f"Processing {len(flashcards)} flashcards...")
-    for i, card in enumerate(flashcards, 1):
-        # Add ID to flashcard
-        card_with_id = {"id": i, **card}
-        flashcards_with_ids.append(card_with_id)
+                # Create corresponding progress entry
+                write_json_array_item(progress_out, create_progress_entry(i), first=(i == 1))
 
-        # Create corresponding progress entry
-        progress_entry = create_progress_entry(i)
-        progress_data.append(progress_entry)
+                count = i
+                if i % 1000 == 0:
+                    print(f"Processed {i} flashcards...")
 
-        if i % 1000 == 0:
-            print(f"Processed {i} flashcards...")
+            closing = b"\n]" if count else b"]"
+            cards_out.write(closing)
+            progress_out.write(closing)
 
-    # Save updated flashcards
-    print("Saving flashcards with IDs...")
-    save_json(flashcards_with_ids, flashcards_with_ids_path)
+        os.replace(cards_tmp_path, flashcards_with_ids_path)
+        os.replace(progress_tmp_path, progress_path)
+    except BaseException:
+        for tmp_path in (cards_tmp_path, progress_tmp_path):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
 
-    # Save progress data
-    print("Saving progress data...")
-    save_json(progress_data, progress_path)
+    print(f"Saved {count} flashcards with IDs and progress entries")
 
     # Create backup of original
     backup_path = f"{flashcards_path}.backup"
     if not os.path.exists(backup_path):
         print("Creating backup of original flashcards...")
-        save_json(flashcards, backup_path)
+        # Plain byte copy (copy_file_range/fcopyfile) - no need to re-encode the JSON
+        shutil.copyfile(flashcards_path, backup_path)
 
     print("Done!")
     print(f"Original flashcards: {flashcards_path}")
@@ -1,12 +1,18 @@
 import os
-import json
 import asyncio
 from typing import List, Dict, Any, Optional
 from enum import Enum
 from pydantic import BaseModel, Field
-from xai_sdk import Client
+from xai_sdk import AsyncClient, Client
 from xai_sdk.chat import user, system
 from dotenv import load_dotenv
+from progress_entries import create_progress_entry
+
+try:
+    import orjson
+except ImportError:  # Fall back to stdlib json when the orjson wheel is unavailable
+    orjson = None
+    import json
 
 load_dotenv()
 
@@ -38,14 +44,33 @@ def load_words_from_file(file_path: str) -> List[str]:
     with open(file_path, 'r', encoding='utf-8') as file:
         return [word.strip() for word in file.readlines() if word.strip()]
 
+def ensure_parent_dir(file_path: str):
+    """Create the directory containing file_path if it doesn't exist."""
+    output_dir = os.path.dirname(file_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+
 def save_flashcards_to_file(flashcards: List[Dict[str, Any]], output_file: str):
     """Save flashcards to file synchronously, creating the file if it doesn't exist."""
     # 'w' mode will create the file if it does not exist, but ensure the directory exists
-    output_dir = os.path.dirname(output_file)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir, exist_ok=True)
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(flashcards, f, indent=2, ensure_ascii=False)
+    ensure_parent_dir(output_file)
+    if orjson is None:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(flashcards, f, indent=2, ensure_ascii=False)
+        return
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(flashcards, option=orjson.OPT_INDENT_2))
+
+def dump_jsonl_line(data: Dict[str, Any]) -> bytes:
+    """Serialize one record as a JSONL line for the checkpoint files"""
+    if orjson is None:
+        return json.dumps(data, ensure_ascii=False).encode('utf-8') + b"\n"
+    return orjson.dumps(data) + b"\n"
+
+def rotate_checkpoint(file_path: str):
+    """Keep the previous run's checkpoint as <file>.prev instead of deleting it"""
+    if os.path.exists(file_path):
+        os.replace(file_path, f"{file_path}.prev")
 
 def prompt_gpt(system_prompt: str, user_prompt: str) -> str:
     # In your terminal, first run:
@@ -63,10 +88,10 @@ def prompt_gpt(system_prompt: str, user_prompt: str) -> str:
     response = chat.sample()
     return response.content
 
-async def prompt_gpt_async(client: Client, system_prompt: str, user_prompt: str) -> Flashcard:
+async def prompt_gpt_async(client: AsyncClient, system_prompt: str, user_prompt: str) -> Flashcard:
     """Async version of prompt_gpt for concurrent API calls with structured output
 
-    Uses chat.aparse() to automatically parse the response into a Flashcard Pydantic model,
+    Uses the async SDK's chat.parse() to automatically parse the response into a Flashcard Pydantic model,
     eliminating the need for manual JSON parsing and providing type safety.
 
     Example usage:
@@ -79,35 +104,39 @@ async def prompt_gpt_async(client: Client, system_prompt: str, user_prompt: str)
     chat.append(system(system_prompt))
     chat.append(user(user_prompt))
 
-    # Use parse method for structured output (run in thread pool since it's sync)
-    response, flashcard = await asyncio.to_thread(chat.parse, Flashcard)
+    # Native async parse - no thread pool hop, so concurrency is only bounded by the caller
+    response, flashcard = await chat.parse(Flashcard)
     return flashcard
 
-async def generate_flashcard_batch(client: Client, words: List[str]) -> List[Dict[str, Any]]:
+SYSTEM_PROMPT = """You are a Japanese language expert. For each Japanese word provided, create a comprehensive flashcard with accurate information. Be precise with readings, translations, and grammatical categories."""
+
+# Maximum number of API calls in flight at once
+CONCURRENCY = 50
+
+async def generate_single_flashcard(client: AsyncClient, card_id: int, word: str) -> Dict[str, Any]:
+    """Generate a flashcard with its id for one word, falling back to a placeholder on error"""
+    user_prompt = f"Create a flashcard for the Japanese word: {word}"
+    try:
+        # Use structured output - returns Flashcard object directly
+        flashcard = await prompt_gpt_async(client, SYSTEM_PROMPT, user_prompt)
+        # Convert Pydantic model to dictionary for JSON serialization
+        return {"id": card_id, **flashcard.model_dump()}
+    except Exception as e:
+        print(f"Error generating flashcard for '{word}': {e}")
+        # Return a basic fallback as dictionary
+        return {
+            "id": card_id,
+            "word": word,
+            "reading": word,  # fallback
+            "english": "Translation not available",
+            "part_of_speech": "other",
+            "example_sentence": f"{word} example",
+            "example_translation": "Example translation not available"
+        }
+
+async def generate_flashcard_batch(client: AsyncClient, words: List[str]) -> List[Dict[str, Any]]:
     """Generate flashcards for a batch of words concurrently"""
-    system_prompt = """You are a Japanese language expert. For each Japanese word provided, create a comprehensive flashcard with accurate information. Be precise with readings, translations, and grammatical categories."""
-
-    async def generate_single_flashcard(word: str) -> Dict[str, Any]:
-        user_prompt = f"Create a flashcard for the Japanese word: {word}"
-        try:
-            # Use structured output - returns Flashcard object directly
-            flashcard = await prompt_gpt_async(client, system_prompt, user_prompt)
-            # Convert Pydantic model to dictionary for JSON serialization
-            return flashcard.model_dump()
-        except Exception as e:
-            print(f"Error generating flashcard for '{word}': {e}")
-            # Return a basic fallback as dictionary
-            return {
-                "word": word,
-                "reading": word,  # fallback
-                "english": "Translation not available",
-                "part_of_speech": "other",
-                "example_sentence": f"{word} example",
-                "example_translation": "Example translation not available"
-            }
-
-    # Generate flashcards for all words in the batch concurrently
-    tasks = [generate_single_flashcard(word) for word in words]
+    tasks = [generate_single_flashcard(client, card_id, word) for card_id, word in enumerate(words, 1)]
     flashcards = await asyncio.gather(*tasks)
     return flashcards
 
@@ -120,46 +149,66 @@ async def generate_flashcards():
 
     print(f"Loaded {len(common_words)} words from {file_path}")
 
-    # Create client once and reuse for all batches
-    client = Client(
+    # Create client once and reuse for all requests
+    client = AsyncClient(
         api_key=os.getenv("XAI_API_KEY"),
         timeout=3600,
     )
 
-    all_flashcards = []
-    batch_size = 20
-
-    # Process words in batches of 20
-    for i in range(0, len(common_words), batch_size):
-        batch_words = common_words[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-        total_batches = (len(common_words) + batch_size - 1) // batch_size
-
-        print(f"Processing batch {batch_num}/{total_batches} (words {i+1}-{min(i+batch_size, len(common_words))})")
-
-        # Log each API call for this batch
-        for word in batch_words:
+    # Cards are written with ids and a matching initial progress file, so the
+    # output is ready for the study interface without a separate id pass
+    output_file = "./flashcard_generation/flashcards_with_ids.json"
+    progress_file = "./flashcard_generation/flashcard_progress.json"
+    # Never clobber real review history the study interface saved here
+    if os.path.exists(progress_file):
+        progress_file = "./flashcard_generation/flashcard_progress.new.json"
+        print("Existing flashcard_progress.json kept; fresh progress will be written to "
+              f"{progress_file} - rename it yourself to start over")
+    checkpoint_file = "./flashcard_generation/flashcards.jsonl"
+    progress_checkpoint_file = "./flashcard_generation/flashcard_progress.jsonl"
+
+    # Start fresh checkpoints for this run; an interrupted run's partial output
+    # is kept alongside as .prev (resuming from it is not supported)
+    for path in (checkpoint_file, progress_checkpoint_file):
+        ensure_parent_dir(path)
+        rotate_checkpoint(path)
+
+    # Schedule every word up front; the semaphore caps in-flight calls, so a slow
+    # response only holds one slot instead of stalling a whole batch
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def bounded(index: int, word: str):
+        async with semaphore:
             print(f"API call: Generating flashcard for '{word}'")
+            return index, word, await generate_single_flashcard(client, index + 1, word)
 
-        # Generate flashcards for this batch concurrently
-        batch_flashcards = await generate_flashcard_batch(client, batch_words)
+    tasks = [asyncio.create_task(bounded(i, word)) for i, word in enumerate(common_words)]
 
-        # Log the output for each API call
-        for word, flashcard in zip(batch_words, batch_flashcards):
+    results: List[Optional[Dict[str, Any]]] = [None] * len(common_words)
+    progress_data: List[Optional[Dict[str, Any]]] = [None] * len(common_words)
+    completed = 0
+    with open(checkpoint_file, 'wb') as cards_out, open(progress_checkpoint_file, 'wb') as progress_out:
+        for next_done in asyncio.as_completed(tasks):
+            index, word, flashcard = await next_done
             print(f"API output for '{word}': {flashcard}")
+            results[index] = flashcard
+            progress_data[index] = create_progress_entry(flashcard["id"])
 
-        # Add to our collection
-        all_flashcards.extend(batch_flashcards)
-
-        # Save progress after each batch (using thread pool for async compatibility)
-        output_file = "./flashcard_generation/flashcards.json"
-        await asyncio.to_thread(save_flashcards_to_file, all_flashcards, output_file)
+            # Checkpoint each card and its progress entry as they arrive; these are
+            # small buffered writes, so they stay on the event loop
+            cards_out.write(dump_jsonl_line(flashcard))
+            progress_out.write(dump_jsonl_line(progress_data[index]))
+            cards_out.flush()
+            progress_out.flush()
 
-        print(f"Saved {len(all_flashcards)} flashcards so far...")
+            completed += 1
+            if completed % 20 == 0 or completed == len(common_words):
+                print(f"Saved {completed}/{len(common_words)} flashcards so far...")
 
-        # Small delay between batches to be respectful to the API
-        if i + batch_size < len(common_words):
-            await asyncio.sleep(1)
+    # Write the full deck and its progress once, in the original word order
+    all_flashcards = results
+    await asyncio.to_thread(save_flashcards_to_file, all_flashcards, output_file)
+    await asyncio.to_thread(save_flashcards_to_file, progress_data, progress_file)
 
     print(f"Completed! Generated {len(all_flashcards)} flashcards")
     return all_flashcards
@@ -191,7 +240,7 @@ async def test_small_batch():
     print(f"Testing with words: {common_words}")
 
     # Create client
-    client = Client(
+    client = AsyncClient(
         api_key=os.getenv("XAI_API_KEY"),
         timeout=3600,
     )
@@ -0,0 +1,25 @@
+"""
+Initial spaced repetition progress entries, shared by the flashcard generator
+and the add_ids_and_progress script.
+"""
+
+from typing import Dict, Any
+
+# Every fresh progress entry is identical apart from its id, so the defaults
+# are built once and only the id is spliced in per card
+PROGRESS_DEFAULTS: Dict[str, Any] = {
+    "date_last_studied": None,
+    "num_times_studied": 0,
+    "ease_factor": 2.5,  # Initial ease factor
+    "interval": 1,       # Initial interval (days)
+    "repetitions": 0,    # Number of successful reviews in a row
+    "total_correct": 0,
+    "total_incorrect": 0,
+    "total_studied": 0,
+    "total_correct_streak": 0,
+    "total_incorrect_streak": 0
+}
+
+def create_progress_entry(card_id: int) -> Dict[str, Any]:
+    """Create initial progress entry for a flashcard."""
+    return {"id": card_id, **PROGRESS_DEFAULTS}
@@ -4,20 +4,178 @@ Setup script for Kokoro TTS
 Downloads model and voices for Japanese TTS
 """
 
+import asyncio
+import hashlib
+import io
+import json
 import os
-import urllib.request
+import re
 import zipfile
 import sys
 
+import httpx
+
+DOWNLOAD_CHUNKS = 8  # Parallel range requests per file
+DOWNLOAD_RETRIES = 3  # Attempts per file; each retry resumes from what is on disk
+STATE_SAVE_BYTES = 8 * 1024 * 1024  # How often to record range progress
+
+def load_download_state(state_path, size, etag):
+    """Load saved range progress, discarding it if the remote file changed"""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('size') == size and state.get('etag') == etag:
+            return state
+    except (OSError, ValueError):
+        pass
+    return {'size': size, 'etag': etag, 'done': {}}
+
+def save_download_state(state_path, state):
+    """Persist range progress so an interrupted download can resume"""
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+async def probe_download(client, url):
+    """Return (size, etag, accepts_ranges) for url, following redirects"""
+    response = await client.head(url)
+    response.raise_for_status()
+
+    # HuggingFace puts the LFS size/etag on the redirect, not the CDN response
+    headers = {}
+    for r in [*response.history, response]:
+        headers.update({k.lower(): v for k, v in r.headers.items()})
+
+    size = headers.get('x-linked-size') or headers.get('content-length')
+    etag = (headers.get('x-linked-etag') or headers.get('etag') or '').strip('"')
+    accepts_ranges = headers.get('accept-ranges', '').lower() == 'bytes'
+    return (int(size) if size else None), etag, accepts_ranges
+
+async def download_range(client, url, fd, lo, hi, state, state_path):
+    """Download bytes lo..hi (inclusive) into fd at their offsets, resuming from saved progress"""
+    key = str(lo)
+    start = lo + state['done'].get(key, 0)
+    if start > hi:
+        return
+
+    unsaved = 0
+    async with client.stream('GET', url, headers={'Range': f'bytes={start}-{hi}'}) as response:
+        if response.status_code != 206:
+            raise IOError(f"Server ignored range request (HTTP {response.status_code})")
+        async for chunk in response.aiter_bytes(1 << 20):
+            os.pwrite(fd, chunk, start)
+            start += len(chunk)
+            state['done'][key] = start - lo
+            unsaved += len(chunk)
+            if unsaved >= STATE_SAVE_BYTES:
+                save_download_state(state_path, state)
+                unsaved = 0
+
+    save_download_state(state_path, state)
+    if start != hi + 1:
+        raise IOError(f"Range {lo}-{hi} ended early at byte {start}")
+
+async def download_stream(client, url, part_path):
+    """Download url sequentially, appending to part_path (resumes if the server allows it)"""
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    async with client.stream('GET', url, headers=headers) as response:
+        if response.status_code == 416:
+            return  # Already complete
+        response.raise_for_status()
+        mode = 'ab' if response.status_code == 206 else 'wb'
+        with open(part_path, mode) as f:
+            async for chunk in response.aiter_bytes(1 << 20):
+                f.write(chunk)
+
+def verify_etag(path, etag):
+    """Check a finished file against a sha256 etag (HuggingFace LFS files); other etags are skipped"""
+    if not re.fullmatch(r'[0-9a-f]{64}', etag):
+        return True
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest() == etag
+
+async def download_file_async(url, filename, chunks=DOWNLOAD_CHUNKS):
+    """Download url to filename with parallel, resumable range requests"""
+    part_path = f"{filename}.part"
+    state_path = f"{filename}.part.state"
+
+    async with httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(60.0)) as client:
+        size, etag, accepts_ranges = await probe_download(client, url)
+
+        if not size or not accepts_ranges:
+            await download_stream(client, url, part_path)
+        else:
+            state = load_download_state(state_path, size, etag)
+            if not os.path.exists(part_path):
+                state['done'] = {}  # Progress is meaningless without the bytes it describes
+            elif not state['done']:
+                os.remove(part_path)  # Stale partial file from a different remote version
+
+            fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                os.ftruncate(fd, size)
+                ranges = [(i * size // chunks, (i + 1) * size // chunks - 1) for i in range(chunks)]
+                tasks = [
+                    asyncio.create_task(download_range(client, url, fd, lo, hi, state, state_path))
+                    for lo, hi in ranges if hi >= lo
+                ]
+                try:
+                    await asyncio.gather(*tasks)
+                finally:
+                    # gather doesn't cancel siblings when one range fails; stop and await
+                    # them here so no pwrite can outlive fd or the client
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                os.close(fd)
+
+    if not verify_etag(part_path, etag):
+        for path in (part_path, state_path):
+            if os.path.exists(path):
+                os.remove(path)
+        raise IOError("Checksum mismatch, discarded partial download")
+
+    os.replace(part_path, filename)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
 def download_file(url, filename):
     """Download a file with progress"""
     print(f"Downloading {filename}...")
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        try:
+            asyncio.run(download_file_async(url, filename))
+            print(f"✅ Downloaded {filename}")
+            return True
+        except Exception as e:
+            if attempt < DOWNLOAD_RETRIES:
+                print(f"⚠️ Download of {filename} interrupted ({e}), resuming...")
+            else:
+                print(f"❌ Failed to download {filename}: {e}")
+    return False
+
+def download_and_extract_zip(url, dest_dir):
+    """Download a (small) zip archive into memory and extract it, without a temp file on disk"""
+    print(f"Downloading and extracting {url.rsplit('/', 1)[-1]}...")
     try:
-        urllib.request.urlretrieve(url, filename)
-        print(f"✅ Downloaded {filename}")
+        buffer = io.BytesIO()
+        with httpx.stream('GET', url, follow_redirects=True, timeout=httpx.Timeout(60.0)) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes(1 << 20):
+                buffer.write(chunk)
+
+        buffer.seek(0)
+        with zipfile.ZipFile(buffer) as zip_ref:
+            zip_ref.extractall(dest_dir)
         return True
     except Exception as e:
-        print(f"❌ Failed to download {filename}: {e}")
+        print(f"❌ Failed to download/extract {url}: {e}")
         return False
 
 def setup_kokoro():
@@ -37,19 +195,8 @@ def setup_kokoro():
 
     # Download voices
     voices_url = "https://huggingface.co/hexgrad/Kokoro-82M/resolve/main/voices.zip"
-    if download_file(voices_url, "voices_temp.zip"):
-        try:
-            # Extract voices
-            print("Extracting voices...")
-            with zipfile.ZipFile("voices_temp.zip", 'r') as zip_ref:
-                zip_ref.extractall(".")
-
-            # Clean up
-            os.remove("voices_temp.zip")
-            print("✅ Voices extracted")
-        except Exception as e:
-            print(f"❌ Failed to extract voices: {e}")
-            success = False
+    if download_and_extract_zip(voices_url, "."):
+        print("✅ Voices extracted")
     else:
         success = False
 
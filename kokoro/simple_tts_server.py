@@ -3,33 +3,90 @@
 Kokoro TTS Server using KPipeline for Japanese Flashcard Study Interface
 """
 
-from flask import Flask, request, send_file, jsonify
-from flask_cors import CORS
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from kokoro import KPipeline
+from cachetools import LRUCache
 import soundfile as sf
+import numpy as np
+import torch
+import uvicorn
+import asyncio
+import base64
+import hashlib
 import io
-import tempfile
 import os
 import sys
-
-app = Flask(__name__)
-CORS(app)  # Enable CORS for web requests
+import threading
 
 # Global TTS pipeline
 pipeline = None
+tts_device = 'cpu'
 japanese_voices = ['jf_alpha', 'jf_gong', 'jm_kumo']  # Available Japanese voices
 
+# Most items one /tts-batch request may ask for, so a single request can't pin a worker indefinitely
+MAX_BATCH_ITEMS = 64
+
+# Generated WAV bytes keyed by (voice, text); review sessions request the same words over and over
+TTS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+tts_cache = LRUCache(maxsize=TTS_CACHE_MAX_BYTES, getsizeof=len)
+tts_cache_lock = threading.Lock()
+
+def tts_cache_key(voice, text):
+    """Compact cache key for a voice/text pair"""
+    return hashlib.blake2b(f"{voice}|{text}".encode('utf-8'), digest_size=16).digest()
+
+def normalize_text(text):
+    """Collapse whitespace so both endpoints synthesize and cache the same text identically"""
+    return ' '.join(text.split())
+
+def parse_tts_item(item):
+    """Validate a {"text", "voice"} request object, returning (text, voice) or raising ValueError"""
+    if not isinstance(item, dict):
+        raise ValueError('Expected a JSON object with a "text" field')
+
+    text = item.get('text', '')
+    voice = item.get('voice', 'jf_alpha')  # Default Japanese female voice
+    if not isinstance(text, str):
+        raise ValueError('"text" must be a string')
+
+    text = normalize_text(text)
+    if not text:
+        raise ValueError('No text provided')
+
+    if voice not in japanese_voices:
+        voice = 'jf_alpha'  # Fallback to default
+
+    return text, voice
+
+def encode_wav(segments):
+    """Encode a text's audio segments as one WAV in memory"""
+    # soundfile needs host-memory arrays, not (possibly CUDA) tensors
+    audio_data = np.concatenate([
+        segment.cpu().numpy() if isinstance(segment, torch.Tensor) else segment
+        for segment in segments
+    ])
+    buffer = io.BytesIO()
+    sf.write(buffer, audio_data, 24000, format='WAV')  # Kokoro uses 24kHz sample rate
+    return buffer.getvalue()
+
 def initialize_tts():
     """Initialize Kokoro TTS pipeline with Japanese support"""
-    global pipeline
+    global pipeline, tts_device
 
     try:
         print("🎵 Initializing Kokoro TTS for Japanese...")
 
+        tts_device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        if tts_device == 'cpu':
+            torch.set_num_threads(os.cpu_count() or 1)
+
         # Initialize Japanese pipeline
-        pipeline = KPipeline(lang_code='j')  # Japanese language code
+        pipeline = KPipeline(lang_code='j', device=tts_device)  # Japanese language code
 
-        print("✅ Kokoro TTS pipeline initialized for Japanese")
+        print(f"✅ Kokoro TTS pipeline initialized for Japanese on {tts_device}")
         print(f"🎯 Available Japanese voices: {japanese_voices}")
 
         return True
@@ -39,91 +96,153 @@ def initialize_tts():
         print("💡 Make sure you have installed: pip install kokoro misaki[ja] soundfile")
         return False
 
-@app.route('/health', methods=['GET'])
-def health_check():
+def synthesize_segments(texts, voice):
+    """Synthesize texts in one pipeline call, returning each text's audio segments in order
+
+    Results are matched to texts by their text_index, since the pipeline may split a
+    long line into several segments or produce nothing for a line without phonemes.
+    """
+    segments = [[] for _ in texts]
+    with torch.inference_mode():
+        for result in pipeline(
+            '\n'.join(texts),
+            voice=voice,
+            speed=1,
+            split_pattern=r'\n+'
+        ):
+            if result.audio is not None:
+                segments[result.text_index].append(result.audio)
+    return segments
+
+def synthesize_batch(entries):
+    """Return {(text, voice): WAV bytes} for every entry, one pipeline call per voice
+
+    Texts must already be normalized (no newlines). Raises RuntimeError naming the
+    text if any audio fails to generate.
+    """
+    # Serve what we can from the cache and group the misses by voice
+    results = {}
+    misses = {}
+    with tts_cache_lock:
+        for text, voice in entries:
+            wav_bytes = tts_cache.get(tts_cache_key(voice, text))
+            if wav_bytes is not None:
+                print(f"🎵 Cache hit for: '{text}' using voice: {voice}")
+                results[(text, voice)] = wav_bytes
+            elif text not in misses.setdefault(voice, []):
+                misses[voice].append(text)
+
+    for voice, texts in misses.items():
+        print(f"🎵 Generating TTS for {len(texts)} text(s) using voice: {voice}")
+
+        for text, segments in zip(texts, synthesize_segments(texts, voice)):
+            if not segments:
+                raise RuntimeError(f"Failed to generate audio for '{text}'")
+
+            wav_bytes = encode_wav(segments)
+            results[(text, voice)] = wav_bytes
+            with tts_cache_lock:
+                tts_cache[tts_cache_key(voice, text)] = wav_bytes
+
+    return results
+
+@asynccontextmanager
+async def lifespan(app):
+    """Initialize the pipeline when started via the uvicorn CLI instead of __main__"""
+    if pipeline is None:
+        initialize_tts()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])  # Enable CORS for web requests
+
+@app.get('/health')
+async def health_check():
     """Health check endpoint"""
-    return jsonify({
+    return {
         'status': 'ok',
         'tts_available': pipeline is not None,
+        'device': tts_device,
         'voices_count': len(japanese_voices),
         'japanese_voices': len(japanese_voices),
         'lang_code': 'j'  # Japanese
-    })
+    }
 
-@app.route('/tts', methods=['POST'])
-def text_to_speech():
+@app.post('/tts')
+async def text_to_speech(request: Request):
     """Convert text to speech using Kokoro KPipeline"""
     if not pipeline:
-        return jsonify({'error': 'TTS pipeline not available'}), 503
+        return JSONResponse({'error': 'TTS pipeline not available'}, status_code=503)
 
     try:
-        data = request.get_json()
-        text = data.get('text', '').strip()
-        voice = data.get('voice', 'jf_alpha')  # Default Japanese female voice
+        data = await request.json()
+        text, voice = parse_tts_item(data)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
 
-        if not text:
-            return jsonify({'error': 'No text provided'}), 400
-
-        if voice not in japanese_voices:
-            voice = 'jf_alpha'  # Fallback to default
-
-        print(f"🎵 Generating TTS for: '{text}' using voice: {voice}")
+    try:
+        # Run inference off the event loop so other requests keep being served
+        results = await asyncio.to_thread(synthesize_batch, [(text, voice)])
 
-        # Generate speech using Kokoro pipeline
-        generator = pipeline(
-            text,
-            voice=voice,
-            speed=1,
-            split_pattern=r'\n+'
+        return Response(
+            content=results[(text, voice)],
+            media_type='audio/wav',
+            headers={'Content-Disposition': 'attachment; filename="tts_output.wav"'}
         )
 
-        # Get the first (and typically only) audio segment
-        audio_data = None
-        for i, (gs, ps, audio) in enumerate(generator):
-            audio_data = audio
-            break  # We only need the first segment
-
-        if audio_data is None:
-            return jsonify({'error': 'Failed to generate audio'}), 500
+    except Exception as e:
+        print(f"❌ TTS Error: {e}")
+        return JSONResponse({'error': str(e)}, status_code=500)
 
-        # Save to temporary WAV file
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_filename = temp_file.name
+@app.post('/tts-batch')
+async def text_to_speech_batch(request: Request):
+    """Convert several texts to speech, synthesizing each voice's texts in one pipeline call
 
-        # Save audio using soundfile
-        sf.write(temp_filename, audio_data, 24000)  # Kokoro uses 24kHz sample rate
+    Expects {"items": [{"text": ..., "voice": ...}, ...]} and returns the items in the
+    same order, each with its WAV audio base64-encoded.
+    """
+    if not pipeline:
+        return JSONResponse({'error': 'TTS pipeline not available'}, status_code=503)
 
-        # Verify file was created and has content
-        if not os.path.exists(temp_filename) or os.path.getsize(temp_filename) == 0:
-            return jsonify({'error': 'Failed to save audio file'}), 500
+    try:
+        data = await request.json()
+        items = data.get('items') if isinstance(data, dict) else None
 
-        # Send the file
-        response = send_file(
-            temp_filename,
-            mimetype='audio/wav',
-            as_attachment=True,
-            download_name='tts_output.wav'
-        )
+        if not isinstance(items, list):
+            raise ValueError('Expected {"items": [...]}')
+        if not items:
+            raise ValueError('No items provided')
+        if len(items) > MAX_BATCH_ITEMS:
+            raise ValueError(f'Too many items (max {MAX_BATCH_ITEMS})')
 
-        # Clean up temp file after sending
-        @response.call_on_close
-        def cleanup():
-            try:
-                os.unlink(temp_filename)
-            except:
-                pass
+        entries = [parse_tts_item(item) for item in items]
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
 
-        return response
+    try:
+        results = await asyncio.to_thread(synthesize_batch, entries)
+
+        return {
+            'items': [
+                {
+                    'text': text,
+                    'voice': voice,
+                    'mimetype': 'audio/wav',
+                    'audio': base64.b64encode(results[(text, voice)]).decode('ascii')
+                }
+                for text, voice in entries
+            ]
+        }
 
     except Exception as e:
-        print(f"❌ TTS Error: {e}")
-        return jsonify({'error': str(e)}), 500
+        print(f"❌ TTS Batch Error: {e}")
+        return JSONResponse({'error': str(e)}, status_code=500)
 
-@app.route('/voices', methods=['GET'])
-def list_voices():
+@app.get('/voices')
+async def list_voices():
     """List available Japanese voices"""
     if not pipeline:
-        return jsonify({'error': 'TTS pipeline not available'}), 503
+        return JSONResponse({'error': 'TTS pipeline not available'}, status_code=503)
 
     voice_list = []
 
@@ -140,41 +259,41 @@ def list_voices():
             'age': 'Adult'
         })
 
-    return jsonify({
+    return {
         'voices': voice_list,
         'japanese_voices': voice_list  # All voices are Japanese
-    })
+    }
 
-@app.route('/set-voice', methods=['POST'])
-def set_voice():
+@app.post('/set-voice')
+async def set_voice(request: Request):
     """Set the TTS voice (Kokoro handles voice per request)"""
     if not pipeline:
-        return jsonify({'error': 'TTS pipeline not available'}), 503
+        return JSONResponse({'error': 'TTS pipeline not available'}, status_code=503)
 
     try:
-        data = request.get_json()
+        data = await request.json()
         voice_id = data.get('voice_id')
 
         if not voice_id:
-            return jsonify({'error': 'No voice_id provided'}), 400
+            return JSONResponse({'error': 'No voice_id provided'}, status_code=400)
 
         if voice_id not in japanese_voices:
-            return jsonify({'error': f'Voice {voice_id} not available'}), 404
+            return JSONResponse({'error': f'Voice {voice_id} not available'}, status_code=404)
 
         print(f"✅ Voice set to: {voice_id}")
 
-        return jsonify({
+        return {
             'success': True,
             'voice': {
                 'id': voice_id,
                 'name': voice_id.replace('jf_', 'Japanese Female ').replace('jm_', 'Japanese Male ').replace('j', 'Japanese '),
                 'languages': ['ja']
             }
-        })
+        }
 
     except Exception as e:
         print(f"❌ Error setting voice: {e}")
-        return jsonify({'error': str(e)}), 500
+        return JSONResponse({'error': str(e)}, status_code=500)
 
 if __name__ == '__main__':
     print("🎵 Starting Kokoro TTS Server...")
@@ -192,6 +311,7 @@ if __name__ == '__main__':
         print("   GET  /voices     - List available Japanese voices")
         print("   POST /set-voice  - Change TTS voice")
         print("   POST /tts        - Generate speech from text")
+        print("   POST /tts-batch  - Generate speech for several texts at once")
         print()
         print("🎯 Japanese voices available: jf_alpha, jf_gong, jm_kumo")
         print("🎯 Language code: 'j' (Japanese)")
@@ -201,4 +321,5 @@ if __name__ == '__main__':
         print("💡 And that you have the Kokoro model files")
         sys.exit(1)
 
-    app.run(host='127.0.0.1', port=8001, debug=True)
+    # One worker: each process would load its own copy of the model
+    uvicorn.run(app, host='127.0.0.1', port=8001)